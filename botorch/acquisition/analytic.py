@@ -7,13 +7,12 @@ Analytic Acquisition Functions that evaluate the posterior without performing
 Monte-Carlo sampling.
 """
 
+import math
 from abc import ABC
-from copy import deepcopy
 from typing import Dict, Optional, Tuple, Union
 
 import torch
 from torch import Tensor
-from torch.distributions import Normal
 
 from ..exceptions import UnsupportedError
 from ..models.gp_regression import FixedNoiseGP
@@ -26,6 +25,10 @@ from .acquisition import AcquisitionFunction
 from .objective import ScalarizedObjective
 
 
+_INV_SQRT2 = 1 / math.sqrt(2)
+_INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+
+
 class AnalyticAcquisitionFunction(AcquisitionFunction, ABC):
     r"""Base class for analytic acquisition functions."""
 
@@ -110,7 +113,7 @@ class ExpectedImprovement(AnalyticAcquisitionFunction):
         self.maximize = maximize
         if not torch.is_tensor(best_f):
             best_f = torch.tensor(best_f)
-        self.register_buffer("best_f", best_f)
+        self.register_buffer("best_f", best_f.detach())
 
     @t_batch_mode_transform(expected_q=1)
     def forward(self, X: Tensor) -> Tensor:
@@ -126,21 +129,12 @@ class ExpectedImprovement(AnalyticAcquisitionFunction):
             A `b1 x ... bk`-dim tensor of Expected Improvement values at the
             given design points `X`.
         """
-        self.best_f = self.best_f.to(X)
+        best_f = self.best_f.to(X)
         posterior = self._get_posterior(X=X)
-        mean = posterior.mean
-        # deal with batch evaluation and broadcasting
-        view_shape = mean.shape[:-2] if mean.dim() >= X.dim() else X.shape[:-2]
-        mean = mean.view(view_shape)
-        sigma = posterior.variance.clamp_min(1e-9).sqrt().view(view_shape)
-        u = (mean - self.best_f.expand_as(mean)) / sigma
-        if not self.maximize:
-            u = -u
-        normal = Normal(torch.zeros_like(u), torch.ones_like(u))
-        ucdf = normal.cdf(u)
-        updf = torch.exp(normal.log_prob(u))
-        ei = sigma * (updf + u * ucdf)
-        return ei
+        mean, sigma = _mean_sigma(posterior=posterior, X=X, min_var=1e-9)
+        return _ei_from_mean_sigma(
+            mean=mean, sigma=sigma, best_f=best_f, maximize=self.maximize
+        )
 
 
 class PosteriorMean(AnalyticAcquisitionFunction):
@@ -206,7 +200,7 @@ class ProbabilityOfImprovement(AnalyticAcquisitionFunction):
         self.maximize = maximize
         if not torch.is_tensor(best_f):
             best_f = torch.tensor(best_f)
-        self.register_buffer("best_f", best_f)
+        self.register_buffer("best_f", best_f.detach())
 
     @t_batch_mode_transform(expected_q=1)
     def forward(self, X: Tensor) -> Tensor:
@@ -220,17 +214,13 @@ class ProbabilityOfImprovement(AnalyticAcquisitionFunction):
             A `(b)`-dim tensor of Probability of Improvement values at the given
             design points `X`.
         """
-        self.best_f = self.best_f.to(X)
+        best_f = self.best_f.to(X)
         posterior = self._get_posterior(X=X)
-        mean, sigma = posterior.mean, posterior.variance.sqrt()
-        batch_shape = X.shape[:-2]
-        mean = posterior.mean.view(batch_shape)
-        sigma = posterior.variance.sqrt().clamp_min(1e-9).view(batch_shape)
-        u = (mean - self.best_f.expand_as(mean)) / sigma
-        if not self.maximize:
-            u = -u
-        normal = Normal(torch.zeros_like(u), torch.ones_like(u))
-        return normal.cdf(u)
+        mean, sigma = _mean_sigma(posterior=posterior, X=X)
+        u = _standardized_improvement(
+            mean=mean, sigma=sigma, best_f=best_f, maximize=self.maximize
+        )
+        return _std_normal_cdf(u)
 
 
 class UpperConfidenceBound(AnalyticAcquisitionFunction):
@@ -270,7 +260,7 @@ class UpperConfidenceBound(AnalyticAcquisitionFunction):
         self.maximize = maximize
         if not torch.is_tensor(beta):
             beta = torch.tensor(beta)
-        self.register_buffer("beta", beta)
+        self.register_buffer("beta", beta.detach())
 
     @t_batch_mode_transform(expected_q=1)
     def forward(self, X: Tensor) -> Tensor:
@@ -284,12 +274,12 @@ class UpperConfidenceBound(AnalyticAcquisitionFunction):
             A `(b)`-dim Tensor of Upper Confidence Bound values at the given
             design points `X`.
         """
-        self.beta = self.beta.to(X)
+        beta = self.beta.to(X)
         posterior = self._get_posterior(X=X)
-        batch_shape = X.shape[:-2]
-        mean = posterior.mean.view(batch_shape)
-        variance = posterior.variance.view(batch_shape)
-        delta = (self.beta.expand_as(mean) * variance).sqrt()
+        mean, sigma = _mean_sigma(posterior=posterior, X=X)
+        # sqrt(beta) * sigma costs one more op than sqrt(beta * variance), but
+        # reuses the clamped sigma and so keeps the gradient finite at zero variance
+        delta = beta.sqrt() * sigma
         if self.maximize:
             return mean + delta
         else:
@@ -342,8 +332,7 @@ class ConstrainedExpectedImprovement(AnalyticAcquisitionFunction):
         super().__init__(model=model)
         self.maximize = maximize
         self.objective_index = objective_index
-        self.constraints = constraints
-        self.register_buffer("best_f", torch.as_tensor(best_f))
+        self.register_buffer("best_f", torch.as_tensor(best_f).detach())
         self._preprocess_constraint_bounds(constraints=constraints)
         self.register_forward_pre_hook(convert_to_target_pre_hook)
 
@@ -366,17 +355,13 @@ class ConstrainedExpectedImprovement(AnalyticAcquisitionFunction):
         # (b) x 1
         mean_obj = means[..., [self.objective_index]]
         sigma_obj = sigmas[..., [self.objective_index]]
-        u = (mean_obj - self.best_f.expand_as(mean_obj)) / sigma_obj
-        if not self.maximize:
-            u = -u
-        normal = Normal(
-            torch.zeros(1, device=u.device, dtype=u.dtype),
-            torch.ones(1, device=u.device, dtype=u.dtype),
+        ei = _ei_from_mean_sigma(
+            mean=mean_obj,
+            sigma=sigma_obj,
+            best_f=self.best_f.unsqueeze(-1),
+            maximize=self.maximize,
         )
-        ei_pdf = torch.exp(normal.log_prob(u))  # (b) x 1
-        ei_cdf = normal.cdf(u)
-        ei = sigma_obj * (ei_pdf + u * ei_cdf)
-        prob_feas = self._compute_prob_feas(X=X, means=means, sigmas=sigmas)
+        prob_feas = self._compute_prob_feas(means=means, sigmas=sigmas)
         ei = ei.mul(prob_feas)
         return ei.squeeze(dim=-1)
 
@@ -390,9 +375,8 @@ class ConstrainedExpectedImprovement(AnalyticAcquisitionFunction):
                 `i` is the output index, and `lower` and `upper` are lower and upper
                 bounds on that output (resp. interpreted as -Inf / Inf if None)
         """
-        constraint_lower, self.constraint_lower_inds = [], []
-        constraint_upper, self.constraint_upper_inds = [], []
-        constraint_both, self.constraint_both_inds = [], []
+        constraint_inds, constraint_lower, constraint_upper = [], [], []
+        constraint_lower_mask, constraint_upper_mask = [], []
         constraint_indices = list(constraints.keys())
         if len(constraint_indices) == 0:
             raise ValueError("There must be at least one constraint.")
@@ -401,19 +385,20 @@ class ConstrainedExpectedImprovement(AnalyticAcquisitionFunction):
                 "Output corresponding to objective should not be a constraint."
             )
         for k in constraint_indices:
-            if constraints[k][0] is not None and constraints[k][1] is not None:
-                if constraints[k][1] <= constraints[k][0]:
-                    raise ValueError("Upper bound is less than the lower bound.")
-                self.constraint_both_inds.append(k)
-                constraint_both.append([constraints[k][0], constraints[k][1]])
-            elif constraints[k][0] is not None:
-                self.constraint_lower_inds.append(k)
-                constraint_lower.append(constraints[k][0])
-            elif constraints[k][1] is not None:
-                self.constraint_upper_inds.append(k)
-                constraint_upper.append(constraints[k][1])
+            lower, upper = constraints[k]
+            if lower is not None and upper is not None and upper <= lower:
+                raise ValueError("Upper bound is less than the lower bound.")
+            if lower is None and upper is None:
+                continue
+            # unbounded sides get a finite placeholder and are masked out in
+            # `_compute_prob_feas`
+            constraint_inds.append(k)
+            constraint_lower.append(0.0 if lower is None else float(lower))
+            constraint_upper.append(0.0 if upper is None else float(upper))
+            constraint_lower_mask.append(float(lower is not None))
+            constraint_upper_mask.append(float(upper is not None))
         self.register_buffer(
-            "constraint_both", torch.tensor(constraint_both, dtype=torch.float)
+            "constraint_inds", torch.tensor(constraint_inds, dtype=torch.long)
         )
         self.register_buffer(
             "constraint_lower", torch.tensor(constraint_lower, dtype=torch.float)
@@ -421,42 +406,74 @@ class ConstrainedExpectedImprovement(AnalyticAcquisitionFunction):
         self.register_buffer(
             "constraint_upper", torch.tensor(constraint_upper, dtype=torch.float)
         )
+        self.register_buffer(
+            "constraint_lower_mask",
+            torch.tensor(constraint_lower_mask, dtype=torch.float),
+        )
+        self.register_buffer(
+            "constraint_upper_mask",
+            torch.tensor(constraint_upper_mask, dtype=torch.float),
+        )
+        # the set of bounded sides is fixed, so only evaluate what is needed
+        if all(constraint_lower_mask) and all(constraint_upper_mask):
+            self._constraint_sides = "both"
+        elif not any(constraint_upper_mask):
+            self._constraint_sides = "lower"
+        elif not any(constraint_lower_mask):
+            self._constraint_sides = "upper"
+        else:
+            self._constraint_sides = "mixed"
 
-    def _compute_prob_feas(self, X: Tensor, means: Tensor, sigmas: Tensor) -> Tensor:
+    def _compute_prob_feas(self, means: Tensor, sigmas: Tensor) -> Tensor:
         r"""Compute feasibility probability for each batch of X.
 
         Args:
-            X: A `(b) x 1 x d`-dim Tensor of `(b)` t-batches of `d`-dim design
-                points each.
             means: A `(b) x t`-dim Tensor of means.
             sigmas: A `(b) x t`-dim Tensor of standard deviations.
         Returns:
-            A `(b) x 1 x 1`-dim tensor of feasibility probabilities
-
-        Note: This function does case-work for upper bound, lower bound, and both-sided
-        bounds. Another way to do it would be to use 'inf' and -'inf' for the
-        one-sided bounds and use the logic for the both-sided case. But this
-        causes an issue with autograd since we get 0 * inf.
-        TODO: Investigate further.
+            A `(b) x 1`-dim tensor of feasibility probabilities
+
+        Note: A two-sided constraint is evaluated as the difference of the two
+        normal cdf values in whichever tail the mean lies, i.e.
+        `Phi(z_upper) - Phi(z_lower)` if the mean is above the midpoint of the
+        bounds and `Phi(-z_lower) - Phi(-z_upper)` otherwise, with
+        `z = (bound - mean) / sigma`. This avoids cancellation when the mean is far
+        outside the bounds on either side. If only some of the constraints are
+        bounded on a given side, missing bounds are handled via a mask rather
+        than by using 'inf' and -'inf' for the one-sided bounds, since the latter
+        causes an issue with autograd (we get 0 * inf).
         """
-        output_shape = list(X.shape)
-        output_shape[-1] = 1
-        prob_feas = torch.ones(output_shape, device=X.device, dtype=X.dtype)
-
-        if len(self.constraint_lower_inds) > 0:
-            normal_lower = _construct_dist(means, sigmas, self.constraint_lower_inds)
-            prob_l = 1 - normal_lower.cdf(self.constraint_lower)
-            prob_feas = prob_feas.mul(torch.prod(prob_l, dim=-1, keepdim=True))
-        if len(self.constraint_upper_inds) > 0:
-            normal_upper = _construct_dist(means, sigmas, self.constraint_upper_inds)
-            prob_u = normal_upper.cdf(self.constraint_upper)
-            prob_feas = prob_feas.mul(torch.prod(prob_u, dim=-1, keepdim=True))
-        if len(self.constraint_both_inds) > 0:
-            normal_both = _construct_dist(means, sigmas, self.constraint_both_inds)
-            prob_u = normal_both.cdf(self.constraint_both[:, 1])
-            prob_l = normal_both.cdf(self.constraint_both[:, 0])
-            prob_feas = prob_feas.mul(torch.prod(prob_u - prob_l, dim=-1, keepdim=True))
-        return prob_feas
+        lower, upper = self.constraint_lower, self.constraint_upper
+        mean = means.index_select(-1, self.constraint_inds)  # (b) x k
+        sigma = sigmas.index_select(-1, self.constraint_inds)  # (b) x k
+        if self._constraint_sides != "upper":
+            z_l = (lower - mean) / sigma
+        if self._constraint_sides != "lower":
+            z_u = (upper - mean) / sigma
+        if self._constraint_sides in ("both", "mixed"):
+            prob_lu = torch.where(
+                mean > 0.5 * (lower + upper),
+                _std_normal_cdf(z_u) - _std_normal_cdf(z_l),
+                _std_normal_cdf(-z_l) - _std_normal_cdf(-z_u),
+            )
+        if self._constraint_sides == "lower":
+            prob = _std_normal_cdf(-z_l)
+        elif self._constraint_sides == "upper":
+            prob = _std_normal_cdf(z_u)
+        elif self._constraint_sides == "both":
+            prob = prob_lu
+        else:
+            mask_l, mask_u = self.constraint_lower_mask, self.constraint_upper_mask
+            mask_lu = mask_l * mask_u
+            prob = (
+                mask_lu * prob_lu
+                + (mask_l - mask_lu) * _std_normal_cdf(-z_l)
+                + (mask_u - mask_lu) * _std_normal_cdf(z_u)
+            )
+        # multiply the constraint probabilities in log-space, clamping to the
+        # smallest positive normal number to keep log and its gradient finite
+        log_prob = prob.clamp_min(torch.finfo(prob.dtype).tiny).log()
+        return log_prob.sum(dim=-1, keepdim=True).exp()
 
 
 class NoisyExpectedImprovement(ExpectedImprovement):
@@ -506,17 +523,15 @@ class NoisyExpectedImprovement(ExpectedImprovement):
             posterior = model.posterior(X=X_observed)
             sampler = SobolQMCNormalSampler(num_fantasies)
             Y_fantasized = sampler(posterior).squeeze(-1)
+            if maximize:
+                best_f = Y_fantasized.max(dim=-1)[0]
+            else:
+                best_f = Y_fantasized.min(dim=-1)[0]
         batch_X_observed = X_observed.expand(num_fantasies, *X_observed.shape)
         # The fantasy model will operate in batch mode
         fantasy_model = _get_noiseless_fantasy_model(
             model=model, batch_X_observed=batch_X_observed, Y_fantasized=Y_fantasized
         )
-
-        if maximize:
-            best_f = Y_fantasized.max(dim=-1)[0]
-        else:
-            best_f = Y_fantasized.min(dim=-1)[0]
-
         super().__init__(model=fantasy_model, best_f=best_f, maximize=maximize)
 
     def forward(self, X: Tensor) -> Tensor:
@@ -533,10 +548,87 @@ class NoisyExpectedImprovement(ExpectedImprovement):
         return super().forward(X.unsqueeze(-3)).mean(dim=-1)
 
 
-def _construct_dist(means: Tensor, sigmas: Tensor, inds: Tensor) -> Normal:
-    mean = means[..., inds]
-    sigma = sigmas[..., inds]
-    return Normal(loc=mean, scale=sigma)
+def _mean_sigma(
+    posterior: Posterior, X: Tensor, min_var: float = 1e-18
+) -> Tuple[Tensor, Tensor]:
+    r"""Extract the marginal means and standard deviations of a posterior at X.
+
+    Args:
+        posterior: A single-output posterior evaluated at the `b x 1 x d`-dim X.
+        X: The `b x 1 x d`-dim candidate set the posterior was evaluated at.
+        min_var: The minimum variance, used to keep the standard deviation
+            bounded away from zero.
+
+    Returns:
+        A two-tuple of `batch_shape`-dim Tensors of means and standard deviations,
+        where `batch_shape` is the batch shape of the posterior if it has at least
+        as many dimensions as X (e.g. for batched fantasy models), and `b`
+        otherwise.
+    """
+    mean, variance = posterior.mean, posterior.variance
+    # deal with batch evaluation and broadcasting
+    batch_shape = mean.shape[:-2] if mean.dim() >= X.dim() else X.shape[:-2]
+    sigma = variance.clamp_min(min_var).sqrt()
+    return mean.reshape(batch_shape), sigma.reshape(batch_shape)
+
+
+def _std_normal_cdf(u: Tensor) -> Tensor:
+    r"""Standard normal cdf, computed as `erfc(-u / sqrt(2)) / 2`."""
+    return 0.5 * torch.erfc(-u * _INV_SQRT2)
+
+
+def _std_normal_pdf(u: Tensor) -> Tensor:
+    r"""Standard normal pdf, computed as `exp(-u^2 / 2) / sqrt(2 * pi)`."""
+    return torch.exp(-0.5 * u * u) * _INV_SQRT_2PI
+
+
+def _standardized_improvement(
+    mean: Tensor, sigma: Tensor, best_f: Tensor, maximize: bool = True
+) -> Tensor:
+    r"""Compute the standardized improvement `u = (mean - best_f) / sigma`.
+
+    Args:
+        mean: A `batch_shape`-dim Tensor of posterior means.
+        sigma: A `batch_shape`-dim Tensor of posterior standard deviations.
+        best_f: A Tensor broadcastable to `batch_shape` with the best function
+            value observed so far.
+        maximize: If True, consider the problem a maximization problem.
+
+    Returns:
+        A `batch_shape`-dim Tensor of standardized improvements (negated if
+        `maximize=False`).
+    """
+    u = (mean - best_f) / sigma
+    if not maximize:
+        u = -u
+    return u
+
+
+def _ei_from_mean_sigma(
+    mean: Tensor, sigma: Tensor, best_f: Tensor, maximize: bool = True
+) -> Tensor:
+    r"""Compute analytic Expected Improvement from the marginal posterior.
+
+    Evaluates `sigma * (phi(u) + u * Phi(u))` with `u = (mean - best_f) / sigma`
+    using elementwise ops rather than a `Normal` distribution.
+
+    Args:
+        mean: A `batch_shape`-dim Tensor of posterior means.
+        sigma: A `batch_shape`-dim Tensor of posterior standard deviations.
+        best_f: A Tensor broadcastable to `batch_shape` with the best function
+            value observed so far.
+        maximize: If True, consider the problem a maximization problem.
+
+    Returns:
+        A `batch_shape`-dim Tensor of Expected Improvement values.
+    """
+    u = _standardized_improvement(
+        mean=mean, sigma=sigma, best_f=best_f, maximize=maximize
+    )
+    ucdf = _std_normal_cdf(u)
+    updf = _std_normal_pdf(u)
+    # fused `updf + u * ucdf`
+    return sigma * torch.addcmul(updf, u, ucdf)
 
 
 def _get_noiseless_fantasy_model(
@@ -573,6 +665,5 @@ def _get_noiseless_fantasy_model(
     # use noiseless fantasies
     fantasy_model.likelihood.noise_covar.noise = torch.full_like(Y_fantasized, 1e-7)
     # load hyperparameters from original model
-    state_dict = deepcopy(model.state_dict())
-    fantasy_model.load_state_dict(state_dict)
+    fantasy_model.load_state_dict(model.state_dict())
     return fantasy_model
@@ -372,6 +372,46 @@ class TestConstrainedExpectedImprovement(unittest.TestCase):
             )
             ei_expected = ei_expected_unconstrained * 0.5 * 0.5 * 0.5
             self.assertTrue(torch.allclose(ei, ei_expected, atol=1e-4))
+            # only lower bounds / only two-sided bounds
+            for constraints in ({2: [5.0, None]}, {3: [-a, a]}):
+                module = ConstrainedExpectedImprovement(
+                    model=mm, best_f=0.0, objective_index=0, constraints=constraints
+                )
+                ei = module(X)
+                ei_expected = ei_expected_unconstrained * 0.5
+                self.assertTrue(torch.allclose(ei, ei_expected, atol=1e-4))
+            # two-sided bound with the mean far above / below the bounds
+            for m_far in (12.0, -12.0):
+                mean_far = torch.tensor(
+                    [[-0.5, 0.0, 5.0, m_far]], device=device, dtype=dtype
+                ).unsqueeze(dim=-2)
+                mm_far = MockModel(MockPosterior(mean=mean_far, variance=variance))
+                z_hi, z_lo = a.item() - m_far, -a.item() - m_far
+                if m_far > 0:  # Phi(z_hi) - Phi(z_lo)
+                    erfc_diff = math.erfc(-z_hi / math.sqrt(2)) - math.erfc(
+                        -z_lo / math.sqrt(2)
+                    )
+                else:  # Phi(-z_lo) - Phi(-z_hi)
+                    erfc_diff = math.erfc(z_lo / math.sqrt(2)) - math.erfc(
+                        z_hi / math.sqrt(2)
+                    )
+                prob = 0.5 * erfc_diff
+                for constraints, factor in (
+                    ({3: [-a, a]}, prob),
+                    ({1: [None, 0], 3: [-a, a]}, 0.5 * prob),
+                ):
+                    module = ConstrainedExpectedImprovement(
+                        model=mm_far,
+                        best_f=0.0,
+                        objective_index=0,
+                        constraints=constraints,
+                    )
+                    ei = module(X)
+                    ei_expected = ei_expected_unconstrained * factor
+                    self.assertTrue((ei > 0).all())
+                    self.assertTrue(
+                        torch.allclose(ei, ei_expected, rtol=1e-3, atol=0.0)
+                    )
             # test maximize
             module_min = ConstrainedExpectedImprovement(
                 model=mm,
@@ -419,6 +459,7 @@ class TestConstrainedExpectedImprovement(unittest.TestCase):
             )
             X = torch.empty(3, 1, 1, device=device, dtype=dtype)  # dummy
             ei = module(X)
+            self.assertEqual(ei.shape, torch.Size([3]))
             ei_expected_unconstrained = torch.tensor(
                 [0.19780, 0.39894, 0.69780], device=device, dtype=dtype
             )
@@ -24,11 +24,11 @@ def generic_obj(samples: Tensor) -> Tensor:
 
 
 def infeasible_con(samples: Tensor) -> Tensor:
-    return torch.ones(samples.shape[0:-1], device=samples.device, dtype=samples.dtype)
+    return samples.new_ones(samples.shape[:-1])
 
 
 def feasible_con(samples: Tensor) -> Tensor:
-    return -torch.ones(samples.shape[0:-1], device=samples.device, dtype=samples.dtype)
+    return samples.new_full(samples.shape[:-1], -1.0)
 
 
 class TestScalarizedObjective(unittest.TestCase):
@@ -41,22 +41,25 @@ class TestScalarizedObjective(unittest.TestCase):
                     weights = torch.randn(o, device=device, dtype=dtype)
                     obj = ScalarizedObjective(weights=weights, offset=offset)
                     posterior = _get_test_posterior(batch_shape, device, dtype, o=o)
-                    mean, covar = posterior.mvn.mean, posterior.mvn.covariance_matrix
+                    mean = posterior.mvn.mean
+                    lazy_covar = posterior.mvn.lazy_covariance_matrix
                     new_posterior = obj(posterior)
-                    exp_size = torch.Size(batch_shape + [1, 1])
+                    exp_size = (*batch_shape, 1, 1)
                     self.assertEqual(new_posterior.mean.shape, exp_size)
                     new_mean_exp = offset + mean @ weights
                     self.assertTrue(
                         torch.allclose(new_posterior.mean[..., -1], new_mean_exp)
                     )
                     self.assertEqual(new_posterior.variance.shape, exp_size)
-                    new_covar_exp = ((covar @ weights) @ weights).unsqueeze(-1)
+                    # evaluate the quadratic form without densifying the covariance
+                    covar_w = lazy_covar.matmul(weights.unsqueeze(-1)).squeeze(-1)
+                    new_covar_exp = (covar_w @ weights).unsqueeze(-1)
                     self.assertTrue(
                         torch.allclose(new_posterior.variance[..., -1], new_covar_exp)
                     )
-                    # test error
-                    with self.assertRaises(ValueError):
-                        ScalarizedObjective(weights=torch.rand(2, o))
+        # test error
+        with self.assertRaises(ValueError):
+            ScalarizedObjective(weights=torch.rand(2, 2, device=device))
 
     def test_affine_acquisition_objective_cuda(self, cuda=False):
         if torch.cuda.is_available():
@@ -89,78 +92,50 @@ class TestGenericMCObjective(unittest.TestCase):
 
 
 class TestConstrainedMCObjective(unittest.TestCase):
+    def _check_constrained(self, samples, constraints, infeasible_cost=0.0):
+        obj = ConstrainedMCObjective(
+            objective=generic_obj,
+            constraints=constraints,
+            infeasible_cost=infeasible_cost,
+        )
+        constrained_obj = apply_constraints(
+            obj=generic_obj(samples),
+            constraints=constraints,
+            samples=samples,
+            infeasible_cost=infeasible_cost,
+        )
+        self.assertTrue(torch.equal(obj(samples), constrained_obj))
+
     def test_constrained_mc_objective(self, cuda=False):
         device = torch.device("cuda") if cuda else torch.device("cpu")
         for dtype in (torch.float, torch.double):
+            # draw samples once, use (sub-)views for the lower-dimensional cases
+            base_samples = torch.randn(4, 3, 2, device=device, dtype=dtype)
             # one feasible constraint
-            obj = ConstrainedMCObjective(
-                objective=generic_obj, constraints=[feasible_con]
-            )
-            samples = torch.randn(1, device=device, dtype=dtype)
-            constrained_obj = generic_obj(samples)
-            constrained_obj = apply_constraints(
-                obj=constrained_obj,
-                constraints=[feasible_con],
-                samples=samples,
-                infeasible_cost=0.0,
+            self._check_constrained(
+                samples=base_samples[0, 0, :1], constraints=[feasible_con]
             )
-            self.assertTrue(torch.equal(obj(samples), constrained_obj))
             # one infeasible constraint
-            obj = ConstrainedMCObjective(
-                objective=generic_obj, constraints=[infeasible_con]
-            )
-            samples = torch.randn(2, device=device, dtype=dtype)
-            constrained_obj = generic_obj(samples)
-            constrained_obj = apply_constraints(
-                obj=constrained_obj,
-                constraints=[infeasible_con],
-                samples=samples,
-                infeasible_cost=0.0,
+            self._check_constrained(
+                samples=base_samples[0, 0], constraints=[infeasible_con]
             )
-            self.assertTrue(torch.equal(obj(samples), constrained_obj))
             # one feasible, one infeasible
-            obj = ConstrainedMCObjective(
-                objective=generic_obj, constraints=[feasible_con, infeasible_con]
-            )
-            samples = torch.randn(2, 1, device=device, dtype=dtype)
-            constrained_obj = generic_obj(samples)
-            constrained_obj = apply_constraints(
-                obj=constrained_obj,
+            self._check_constrained(
+                samples=base_samples[0, :2, :1],
                 constraints=[feasible_con, infeasible_con],
-                samples=samples,
-                infeasible_cost=0.0,
             )
-            self.assertTrue(torch.equal(obj(samples), constrained_obj))
             # one feasible, one infeasible, infeasible_cost
-            obj = ConstrainedMCObjective(
-                objective=generic_obj,
+            self._check_constrained(
+                samples=base_samples[0],
                 constraints=[feasible_con, infeasible_con],
                 infeasible_cost=5.0,
             )
-            samples = torch.randn(3, 2, device=device, dtype=dtype)
-            constrained_obj = generic_obj(samples)
-            constrained_obj = apply_constraints(
-                obj=constrained_obj,
-                constraints=[feasible_con, infeasible_con],
-                samples=samples,
-                infeasible_cost=5.0,
-            )
-            self.assertTrue(torch.equal(obj(samples), constrained_obj))
             # one feasible, one infeasible, infeasible_cost, higher dimension
-            obj = ConstrainedMCObjective(
-                objective=generic_obj,
-                constraints=[feasible_con, infeasible_con],
-                infeasible_cost=5.0,
-            )
-            samples = torch.randn(4, 3, 2, device=device, dtype=dtype)
-            constrained_obj = generic_obj(samples)
-            constrained_obj = apply_constraints(
-                obj=constrained_obj,
+            self._check_constrained(
+                samples=base_samples,
                 constraints=[feasible_con, infeasible_con],
-                samples=samples,
                 infeasible_cost=5.0,
             )
-            self.assertTrue(torch.equal(obj(samples), constrained_obj))
 
     def test_constrained_mc_objective_cuda(self, cuda=False):
         if torch.cuda.is_available():
@@ -172,17 +147,18 @@ class TestIdentityMCObjective(unittest.TestCase):
         device = torch.device("cuda") if cuda else torch.device("cpu")
         for dtype in (torch.float, torch.double):
             obj = IdentityMCObjective()
+            base_samples = torch.randn(3, 2, device=device, dtype=dtype)
             # single-element tensor
-            samples = torch.randn(1, device=device, dtype=dtype)
+            samples = base_samples[:1, 0]
             self.assertTrue(torch.equal(obj(samples), samples[0]))
             # single-dimensional non-squeezable tensor
-            samples = torch.randn(2, device=device, dtype=dtype)
+            samples = base_samples[0]
             self.assertTrue(torch.equal(obj(samples), samples))
             # two-dimensional squeezable tensor
-            samples = torch.randn(3, 1, device=device, dtype=dtype)
+            samples = base_samples[:, :1]
             self.assertTrue(torch.equal(obj(samples), samples.squeeze(-1)))
             # two-dimensional non-squeezable tensor
-            samples = torch.randn(3, 2, device=device, dtype=dtype)
+            samples = base_samples
             self.assertTrue(torch.equal(obj(samples), samples))
 
     def test_identity_mc_objective_cuda(self, cuda=False):
@@ -205,15 +181,19 @@ class TestLinearMCObjective(unittest.TestCase):
                 torch.allclose(obj(samples), (samples * weights).sum(dim=-1))
             )
             # make sure this errors if sample output dimensions are incompatible
-            with self.assertRaises(RuntimeError):
-                obj(samples=torch.randn(2, device=device, dtype=dtype))
-            with self.assertRaises(RuntimeError):
-                obj(samples=torch.randn(1, device=device, dtype=dtype))
+            for bad_samples in (
+                torch.randn(2, device=device, dtype=dtype),
+                torch.randn(1, device=device, dtype=dtype),
+            ):
+                with self.assertRaises(RuntimeError):
+                    obj(samples=bad_samples)
             # make sure we can't construct objectives with multi-dim. weights
-            with self.assertRaises(ValueError):
-                LinearMCObjective(weights=torch.rand(2, 3, device=device, dtype=dtype))
-            with self.assertRaises(ValueError):
-                LinearMCObjective(weights=torch.tensor(1.0, device=device, dtype=dtype))
+            for bad_weights in (
+                torch.rand(2, 3, device=device, dtype=dtype),
+                torch.tensor(1.0, device=device, dtype=dtype),
+            ):
+                with self.assertRaises(ValueError):
+                    LinearMCObjective(weights=bad_weights)
 
     def test_linear_mc_objective_cuda(self, cuda=False):
         if torch.cuda.is_available():